@@ -1,13 +1,15 @@
 import argparse
 import logging
-from Bio import SeqIO
+import re
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from fasta_utils import format_fasta_record, open_fasta_file
 
 def setup_logging():
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Extract sequences from a FASTA file based on provided search strings.")
-    parser.add_argument("--fasta_file", required=True, help="The FASTA file to search through.")
+    parser.add_argument("--fasta_file", required=True, help="The FASTA file (compressed or uncompressed) to search through.")
     parser.add_argument("--search_strings", required=True, help="Comma-separated list of search strings to match against sequence descriptions.")
     parser.add_argument("--output_file", default="filtered_sequences.fasta", help="File to save the extracted sequences.")
     return parser.parse_args()
@@ -15,17 +17,28 @@ def parse_arguments():
 def filter_sequences(fasta_path, search_strings, output_file):
     search_terms = search_strings.split(',')
     logging.info(f"Searching for sequences that match any of: {search_terms}")
-    sequences_found = []
-
-    with open(fasta_path, "r") as fasta_file:
-        for record in SeqIO.parse(fasta_file, "fasta"):
-            if any(search_term.lower() in record.description.lower() for search_term in search_terms):
-                sequences_found.append(record)
-                logging.debug(f"Matched: {record.description}")
-
-    if sequences_found:
-        SeqIO.write(sequences_found, output_file, "fasta")
-        logging.info(f"Extracted {len(sequences_found)} sequences to {output_file}")
+    # The pattern ignores case, so terms differing only in case need a single alternative
+    unique_terms = dict.fromkeys(search_term.lower() for search_term in search_terms)
+    pattern = re.compile('|'.join(re.escape(search_term) for search_term in unique_terms), re.IGNORECASE)
+    count = 0
+    out = None
+
+    # The output file is only created on the first match, so an existing file is left alone when nothing matches
+    try:
+        with open_fasta_file(fasta_path) as fasta_file:
+            for title, seq in SimpleFastaParser(fasta_file):
+                if pattern.search(title):
+                    if out is None:
+                        out = open(output_file, "w")
+                    out.write(format_fasta_record(title, seq))
+                    count += 1
+                    logging.debug(f"Matched: {title}")
+    finally:
+        if out is not None:
+            out.close()
+
+    if count:
+        logging.info(f"Extracted {count} sequences to {output_file}")
     else:
         logging.info("No matches found.")
 
@@ -0,0 +1,17 @@
+import gzip
+import io
+
+FASTA_BUFFER_SIZE = 1 << 20
+
+def open_fasta_file(filename):
+    """Open fasta file, supporting both compressed (.gz) and uncompressed formats"""
+    if filename.endswith('.gz'):
+        return io.TextIOWrapper(io.BufferedReader(gzip.open(filename, 'rb'), buffer_size=FASTA_BUFFER_SIZE))
+    else:
+        return open(filename, 'r', buffering=FASTA_BUFFER_SIZE)
+
+def format_fasta_record(title, seq, width=60):
+    """Format a FASTA record as SeqIO would, wrapping the sequence at the given width."""
+    lines = [f">{title}\n"]
+    lines.extend(f"{seq[i:i + width]}\n" for i in range(0, len(seq), width))
+    return ''.join(lines)
@@ -1,9 +1,18 @@
 import argparse
 import logging
 import os
+import numpy as np
 import pandas as pd
-from Bio import SeqIO
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from fasta_utils import format_fasta_record, open_fasta_file
 import re
+import tempfile
+
+EXCEL_COLUMNS = ['Species', 'Virus name(s)', 'Virus GENBANK accession', 'Family', 'Genus']
+
+_NONWORD = re.compile(r'[^\w\s-]')
+_WHITESPACE = re.compile(r'\s+')
+_ACC_PAIRS = re.compile(r'\b([LSM]):\s*([\w-]+(?:,[\w-]+)*)')
 
 def setup_logging():
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,7 +20,7 @@ def setup_logging():
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Extract sequences based on ICTV Excel data and save into new FASTA files.")
     parser.add_argument("excel_file", help="Excel file with the virus data.")
-    parser.add_argument("fasta_file", help="FASTA file with the sequences.")
+    parser.add_argument("fasta_file", help="FASTA file (compressed or uncompressed) with the sequences.")
     parser.add_argument("--output_folder", default=".", help="Folder to save the output FASTA files.")
     parser.add_argument("--segment", default="all", choices=["L", "M", "S", "all"], help="Segment to export (L, M, S, or all).")
     parser.add_argument("--family", help="Filter by family.")
@@ -21,37 +30,80 @@ def parse_arguments():
 
 def sanitize_filename(filename):
     """Sanitize the filename by replacing spaces and special characters with underscores."""
-    filename = re.sub(r'[^\w\s-]', '', filename)
-    filename = re.sub(r'\s+', '_', filename)
+    filename = _NONWORD.sub('', filename)
+    filename = _WHITESPACE.sub('_', filename)
     return filename
 
+def contains_ignore_case(column, term):
+    """Return a boolean mask of the rows in column containing term, ignoring case and treating missing values as no match."""
+    values = column.fillna('').str.lower().to_numpy(dtype=str)
+    return np.char.find(values, term.lower()) >= 0
+
+def read_excel_table(excel_path):
+    """Read the needed Excel columns, caching them as Parquet next to the Excel file to skip parsing it on later runs."""
+    cache_path = f"{excel_path}.parquet"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(excel_path):
+        try:
+            df = pd.read_parquet(cache_path)
+            logging.info(f"Read cached table {cache_path}")
+            return df
+        except Exception as e:
+            # A missing Parquet engine or an unreadable cache is treated as a cache miss
+            logging.warning(f"Cannot read Parquet cache {cache_path}, reading {excel_path} instead: {e}")
+    try:
+        # calamine (pandas >= 2.2 with python-calamine) parses .xlsx much faster than openpyxl
+        df = pd.read_excel(excel_path, engine='calamine', usecols=EXCEL_COLUMNS, dtype=str)
+    except (ImportError, ValueError) as e:
+        # Only fall back when the engine itself is unavailable, pandas < 2.2 reports it as "Unknown engine"
+        if isinstance(e, ValueError) and 'Unknown engine' not in str(e):
+            raise
+        logging.debug(f"calamine engine unavailable ({e}), reading {excel_path} with the default engine")
+        df = pd.read_excel(excel_path, usecols=EXCEL_COLUMNS, dtype=str)
+    # Write to a temporary file and move it into place so an interrupted run never leaves a truncated cache
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(cache_path) + '.', dir=os.path.dirname(cache_path) or '.')
+        os.close(fd)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        logging.info(f"Cached table as {cache_path}")
+    except (ImportError, OSError) as e:
+        logging.debug(f"Cannot write Parquet cache {cache_path}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
 def extract_data_from_excel(excel_path, segment, family=None, genus=None, species=None):
     """Extract relevant data from the Excel file and filter by segment if not 'all' and other taxonomy filters."""
-    df = pd.read_excel(excel_path)
+    df = read_excel_table(excel_path)
+    mask = np.ones(len(df), dtype=bool)
     if segment != "all":
-        df = df[df['Virus GENBANK accession'].str.contains(f'{segment}:')]
-    if family:
-        df = df[df['Family'].str.contains(family, case=False, na=False)]
-    if genus:
-        df = df[df['Genus'].str.contains(genus, case=False, na=False)]
-    if species:
-        df = df[df['Species'].str.contains(species, case=False, na=False)]
-    return df[['Species', 'Virus name(s)', 'Virus GENBANK accession']].dropna()
+        mask &= df['Virus GENBANK accession'].str.contains(f'{segment}:', regex=False, na=False).to_numpy()
+    for column, term in (('Family', family), ('Genus', genus), ('Species', species)):
+        if term:
+            mask &= contains_ignore_case(df[column], term)
+    df = df[mask].drop(columns=['Family', 'Genus'])
+    return df.dropna()
+
+def split_trailing_digits(accession):
+    """Split an accession into its prefix and trailing number, e.g. 'AB12345' -> ('AB', '12345')."""
+    i = len(accession)
+    while i > 0 and accession[i - 1].isdigit():
+        i -= 1
+    return accession[:i], accession[i:]
 
 def parse_accession_ids(accession_str, segment):
     """Parse the accession IDs from the string, handling multiple entries and ranges, filtered by segment if not 'all'."""
     acc_dict = {}
-    id_pairs = re.findall(r'\b([LSM]):\s*([\w-]+(?:,[\w-]+)*)', accession_str)
-    for key, group in id_pairs:
+    for key, group in _ACC_PAIRS.findall(accession_str):
         if segment != "all" and key != segment:
             continue
         ids = []
         for part in group.split(','):
             if '-' in part:
                 start, end = part.split('-')
-                start_num = re.search(r'\d+$', start).group(0)
-                end_num = re.search(r'\d+$', end).group(0)
-                start_prefix = start[:-len(start_num)]
+                start_prefix, start_num = split_trailing_digits(start)
+                _, end_num = split_trailing_digits(end)
                 for num in range(int(start_num), int(end_num) + 1):
                     ids.append(f"{start_prefix}{num}")
             else:
@@ -60,12 +112,20 @@ def parse_accession_ids(accession_str, segment):
     return acc_dict
 
 def read_fasta_sequences(fasta_path, accessions):
-    """Read and store FASTA sequences that match the given accession IDs."""
-    records = SeqIO.to_dict(SeqIO.parse(fasta_path, 'fasta'), key_function=lambda record: record.id.split('.')[0])
-    return {acc: records.get(acc) for acc in accessions if acc in records}
+    """Read and store (title, sequence) pairs for the FASTA records that match the given accession IDs."""
+    hits = {}
+    with open_fasta_file(fasta_path) as fasta_file:
+        for title, seq in SimpleFastaParser(fasta_file):
+            acc = (title.split(None, 1) or [''])[0].split('.')[0]
+            if acc in accessions:
+                hits[acc] = (title, seq)
+    return hits
 
 def write_fasta_files(df, sequences, output_folder, segment):
-    """Write sequences to new FASTA files based on DataFrame information and segment."""
+    """Write sequences to new FASTA files based on DataFrame information and segment.
+
+    Expects the 'parsed_accessions' column added in main with the output of parse_accession_ids.
+    """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     for _, row in df.iterrows():
@@ -74,19 +134,23 @@ def write_fasta_files(df, sequences, output_folder, segment):
         filename_suffix = f"_{segment}.fasta" if segment != "all" else "_all.fasta"
         filename = f"{species}_{virus_name}{filename_suffix}"
         filepath = os.path.join(output_folder, filename)
-        acc_dict = parse_accession_ids(row['Virus GENBANK accession'], segment)
+        acc_dict = row['parsed_accessions']
+        records = []
+        for key in acc_dict:
+            for acc in acc_dict[key]:
+                if acc in sequences:
+                    records.append(format_fasta_record(*sequences[acc]))
         with open(filepath, 'w') as f:
-            for key in acc_dict:
-                for acc in acc_dict[key]:
-                    if sequences.get(acc):
-                        SeqIO.write(sequences[acc], f, 'fasta')
+            f.write(''.join(records))
         logging.info(f"Written {filepath}")
 
 def main():
     setup_logging()
     args = parse_arguments()
     df = extract_data_from_excel(args.excel_file, args.segment, args.family, args.genus, args.species)
-    accessions = set(acc for row in df['Virus GENBANK accession'] for key in parse_accession_ids(row, args.segment) for acc in parse_accession_ids(row, args.segment)[key])
+    parsed = [parse_accession_ids(row, args.segment) for row in df['Virus GENBANK accession']]
+    df = df.assign(parsed_accessions=parsed)
+    accessions = {acc for acc_dict in parsed for ids in acc_dict.values() for acc in ids}
     sequences = read_fasta_sequences(args.fasta_file, accessions)
     write_fasta_files(df, sequences, args.output_folder, args.segment)
 
@@ -2,6 +2,8 @@ import argparse
 import logging
 from collections import defaultdict
 
+READ_BUFFER_SIZE = 1 << 20
+
 def setup_logging():
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -13,7 +15,7 @@ def parse_arguments():
 
 def parse_accessions(file_path):
     accessions = defaultdict(list)
-    with open(file_path, 'r') as file:
+    with open(file_path, 'r', buffering=READ_BUFFER_SIZE) as file:
         for line in file:
             parts = line.strip().split(';')
             for part in parts:
@@ -25,7 +27,7 @@ def parse_accessions(file_path):
 def write_outputs(accessions, output_prefix):
     for key in accessions:
         with open(f"{output_prefix}_{key}.txt", 'w') as file:
-            file.writelines(f"{item}\n" for item in accessions[key])
+            file.write('\n'.join(accessions[key]) + '\n')
         logging.info(f"Output for {key} written to {output_prefix}_{key}.txt")
 
 def main():
@@ -1,21 +1,96 @@
 import argparse
-import regex
 import logging
 import gzip
+import io
 import csv
-from Bio import SeqIO
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+import numpy as np
+from Bio.SeqIO.FastaIO import SimpleFastaParser
 
-def count_homopolymers(seq, max_length):
-    """Given a string sequence, return a dictionary counting its homopolymers"""
-    # Split the string into homopolymers
-    segments = filter(None, regex.findall(r'[A]+|[T]+|[C]+|[G]+', seq.upper()))
-    mers_dict = {base: [0] * max_length for base in 'ATCG'}
-    for segment in segments:
-        ntide = segment[0]
-        cnt = len(segment)
-        if cnt <= max_length:
-            mers_dict[ntide][cnt - 1] += 1
-    return mers_dict
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+FASTA_BUFFER_SIZE = 1 << 20
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Approximate number of sequence bytes sent to a worker at a time when --threads > 1
+BATCH_BYTES = 4 << 20
+BASES = 'ATCG'
+_NOT_A_BASE = 255
+
+# bytes.translate table giving the row index in the counts array for each byte value (either case),
+# 255 for anything that is not a base
+_BASE_CODES = bytearray([_NOT_A_BASE]) * 256
+for _i, _base in enumerate(BASES):
+    _BASE_CODES[ord(_base)] = _i
+    _BASE_CODES[ord(_base.lower())] = _i
+_BASE_CODES = bytes(_BASE_CODES)
+
+def _count_hp_numpy(codes, out, max_length):
+    """Vectorized run-length count of base codes, adding homopolymer counts to out"""
+    if codes.size == 0:
+        return
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+    lengths = np.diff(np.append(starts, codes.size))
+    run_codes = codes[starts]
+    keep = (run_codes != _NOT_A_BASE) & (lengths <= max_length)
+    np.add.at(out, (run_codes[keep], lengths[keep] - 1), 1)
+
+if njit is not None:
+    @njit(cache=True)
+    def _count_hp(codes, out, max_length):
+        """Run-length scan over base codes, adding homopolymer counts to out"""
+        prev = _NOT_A_BASE
+        run_len = 0
+        for i in range(codes.shape[0]):
+            b = codes[i]
+            if b == prev:
+                run_len += 1
+                continue
+            if prev != _NOT_A_BASE and run_len <= max_length:
+                out[prev, run_len - 1] += 1
+            prev = b
+            run_len = 1
+        if prev != _NOT_A_BASE and run_len <= max_length:
+            out[prev, run_len - 1] += 1
+else:
+    # Numba is optional, fall back to the numpy implementation
+    _count_hp = _count_hp_numpy
+
+def count_homopolymers(seq, totals, max_length):
+    """Given a string sequence, add its homopolymer counts to the (base, length) totals array"""
+    codes = np.frombuffer(seq.encode('ascii', 'replace').translate(_BASE_CODES), dtype=np.uint8)
+    _count_hp(codes, totals, max_length)
+
+def record_name(title):
+    """Return the record identifier (first word) of a FASTA title, or '' for an empty header"""
+    return (title.split(None, 1) or [''])[0]
+
+def count_batch(seqs, max_length):
+    """Count homopolymers in a batch of sequences, returning a (base, length) counts array"""
+    counts = np.zeros((len(BASES), max_length), dtype=np.int64)
+    for seq in seqs:
+        count_homopolymers(seq, counts, max_length)
+    return counts
+
+def iter_batches(records, batch_bytes):
+    """Group (title, sequence) records into lists holding about batch_bytes of sequence
+
+    A batch is yielded as soon as it reaches batch_bytes, so a record larger than that forms its own batch.
+    """
+    batch = []
+    size = 0
+    for record in records:
+        batch.append(record)
+        size += len(record[1])
+        if size >= batch_bytes:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
 
 def parse_args():
     """Parse command line arguments"""
@@ -23,14 +98,15 @@ def parse_args():
     parser.add_argument('fasta', type=str, help='Fasta file (compressed or uncompressed) with sequences to count homopolymers.')
     parser.add_argument('--max_length', type=int, default=7, help='Maximum length of homopolymers to count.')
     parser.add_argument('--output', type=str, help='Output tab-delimited text file to save the results.')
+    parser.add_argument('--threads', type=int, default=1, help='Number of worker processes used to count homopolymers.')
     return parser.parse_args()
 
 def open_fasta_file(filename):
     """Open fasta file, supporting both compressed (.gz) and uncompressed formats"""
     if filename.endswith('.gz'):
-        return gzip.open(filename, 'rt')
+        return io.TextIOWrapper(io.BufferedReader(gzip.open(filename, 'rb'), buffer_size=FASTA_BUFFER_SIZE))
     else:
-        return open(filename, 'r')
+        return open(filename, 'r', buffering=FASTA_BUFFER_SIZE)
 
 def main():
     # Set up logging
@@ -38,32 +114,44 @@ def main():
     args = parse_args()
     
     logging.info(f"Processing fasta file {args.fasta}")
-    totals = {base: [0] * args.max_length for base in 'ATCG'}
+    totals = np.zeros((len(BASES), args.max_length), dtype=np.int64)
     
     with open_fasta_file(args.fasta) as inFile:
-        for record in SeqIO.parse(inFile, "fasta"):
-            seq_dict = count_homopolymers(str(record.seq), args.max_length)
-            logging.info(f"Processing sequence {record.name}")
-            for base, counts in seq_dict.items():
-                totals[base] = [sum(i) for i in zip(totals[base], counts)]
+        if args.threads > 1:
+            # Parse in the main process and count batches of records in the workers,
+            # keeping a bounded number of batches in flight
+            with ProcessPoolExecutor(max_workers=args.threads) as executor:
+                pending = set()
+                for batch in iter_batches(SimpleFastaParser(inFile), BATCH_BYTES):
+                    for title, _ in batch:
+                        logging.info(f"Processing sequence {record_name(title)}")
+                    pending.add(executor.submit(count_batch, [seq for _, seq in batch], args.max_length))
+                    if len(pending) >= 2 * args.threads:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            totals += future.result()
+                for future in as_completed(pending):
+                    totals += future.result()
+        else:
+            for title, seq in SimpleFastaParser(inFile):
+                count_homopolymers(seq, totals, args.max_length)
+                logging.info(f"Processing sequence {record_name(title)}")
     
-    results = []
-    for base, counts in totals.items():
-        for length in range(1, args.max_length + 1):
-            nucleotide_sequence = base * length
-            results.append((f"{length}{base}", nucleotide_sequence, counts[length - 1]))
+    results = [(f"{length}{base}", base * length, count)
+               for base, counts in zip(BASES, totals.tolist())
+               for length, count in enumerate(counts, start=1)]
     
     # Output results to tab-delimited text file if specified, otherwise print to console
     if args.output:
         logging.info(f"Writing results to {args.output}")
-        with open(args.output, 'w', newline='') as txtfile:
+        with open(args.output, 'w', newline='', buffering=OUTPUT_BUFFER_SIZE) as txtfile:
             writer = csv.writer(txtfile, delimiter='\t')
             writer.writerow(["length", "nucleotides", "counts"])
             writer.writerows(results)
     else:
-        print("length\tnucleotides\tcounts")
-        for row in results:
-            print("\t".join(map(str, row)))
+        lines = ["length\tnucleotides\tcounts"]
+        lines.extend("\t".join(map(str, row)) for row in results)
+        sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == '__main__':
     main()